@@ -1,124 +1,125 @@
+import functools
+import hashlib
+import os
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from dash import Dash, dcc, html, Input, Output, State
-import plotly.express as px
+from flask_caching import Cache
 import plotly.graph_objects as go
 
+# Bump when the summary or chart output changes, to invalidate responses cached on disk
+RESPONSE_VERSION = 1
+
+CSV_PATH = 'top_100_cited_companies_consolidated.csv'
+PARQUET_PATH = 'top_100_cited_companies_consolidated.parquet'
+# Parquet metadata key recording which CSV contents and dtypes the file was built from
+FINGERPRINT_KEY = b'source_fingerprint'
+
+def get_csv_dtypes(columns):
+    """Get the dtype map for the CSV: categorical company columns and compact numeric counts"""
+    # Per-year citation counts exceed the int16 range, so they are stored as int32
+    dtypes = {col: 'int32' for col in columns if col.isdigit()}
+    dtypes.update({
+        'assignee_id': 'category',
+        'raw_assignee_organization': 'category',
+        'cited_year': 'int16',
+        'patents_assigned': 'int32',
+        'total_citations': 'int32'
+    })
+    return dtypes
+
+def read_csv_data(path=CSV_PATH):
+    """Read the consolidated companies CSV with categorical company columns and compact numeric dtypes"""
+    columns = pd.read_csv(path, nrows=0).columns
+    return pd.read_csv(path, dtype=get_csv_dtypes(columns))
+
+def get_source_fingerprint(csv_path=CSV_PATH):
+    """Hash the CSV contents together with the dtype map used to read it"""
+    with open(csv_path, 'rb') as f:
+        content = f.read()
+    columns = content.split(b'\n', 1)[0].decode().strip().split(',')
+    digest = hashlib.sha256(content)
+    digest.update(repr(sorted(get_csv_dtypes(columns).items())).encode())
+    return digest.hexdigest().encode()
+
+def convert_to_parquet(csv_path=CSV_PATH, parquet_path=PARQUET_PATH, fingerprint=None):
+    """Rebuild the Parquet copy of the data from the CSV, tagged with its source fingerprint, and return the data"""
+    df = read_csv_data(csv_path)
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[FINGERPRINT_KEY] = fingerprint or get_source_fingerprint(csv_path)
+    try:
+        pq.write_table(table.replace_schema_metadata(metadata), parquet_path, compression='snappy')
+    except OSError as err:
+        # e.g. a read-only deploy directory; the data already read is still usable
+        print(f"Could not write '{parquet_path}': {err}")
+    return df
+
 def load_data():
-    """Load the consolidated companies data"""
-    return pd.read_csv('top_100_cited_companies_consolidated.csv')
+    """Load the consolidated companies data from the Parquet copy, rebuilding it when the CSV or its dtypes change"""
+    if not os.path.exists(CSV_PATH):
+        return pd.read_parquet(PARQUET_PATH, engine='pyarrow')
+    fingerprint = get_source_fingerprint()
+    if os.path.exists(PARQUET_PATH) and (pq.read_schema(PARQUET_PATH).metadata or {}).get(FINGERPRINT_KEY) == fingerprint:
+        return pd.read_parquet(PARQUET_PATH, engine='pyarrow')
+    return convert_to_parquet(fingerprint=fingerprint)
 
-def get_company_list(df):
+def get_data_version(df):
+    """Hash the loaded data, so cached responses are tied to the exact data they were built from"""
+    return hashlib.sha256(pd.util.hash_pandas_object(df, index=False).values.tobytes()).hexdigest()[:16]
+
+def get_company_list(df, company_names):
     """Get list of companies for the dropdown"""
-    companies = df.groupby(['assignee_id', 'raw_assignee_organization']).size().reset_index()
-    companies['display_name'] = companies['raw_assignee_organization'] + ' (' + companies['assignee_id'].str[:8] + '...)'
+    # The categorical dtype already holds the distinct assignee_ids; unused categories have no name and are dropped
+    assignee_ids = df['assignee_id'].cat.categories
+    companies = pd.DataFrame({
+        'assignee_id': assignee_ids,
+        'raw_assignee_organization': assignee_ids.map(company_names)
+    }).dropna()
+    short_ids = companies['assignee_id'].astype(str).str.slice(stop=8)
+    companies = companies.assign(
+        display_name=companies['raw_assignee_organization'].astype(str) + ' (' + short_ids + '...)'
+    )
     return companies[['assignee_id', 'display_name']].sort_values('display_name')
 
+def get_company_names(df):
+    """Map each assignee_id to its organization name"""
+    return df.drop_duplicates('assignee_id').set_index('assignee_id')['raw_assignee_organization'].to_dict()
+
+def get_yearly_totals(df):
+    """Sum patents, total citations and per-year citations per (assignee_id, cited_year) in one pass"""
+    value_cols = ['patents_assigned', 'total_citations'] + [col for col in df.columns if col.isdigit()]
+    return df.groupby(['assignee_id', 'cited_year'], observed=True, sort=False)[value_cols].sum().sort_index()
+
+def get_citations_received(yearly_totals):
+    """Reshape the per-year citation columns into a long table indexed by (assignee_id, cited_year)"""
+    year_cols = [col for col in yearly_totals.columns if col.isdigit()]
+    long_df = yearly_totals.reset_index().melt(
+        id_vars=['assignee_id', 'cited_year'],
+        value_vars=year_cols,
+        var_name='receiving_year',
+        value_name='citations'
+    )
+    long_df['receiving_year'] = long_df['receiving_year'].astype('int16')
+    long_df = long_df.sort_values(['assignee_id', 'cited_year', 'receiving_year'])
+    return long_df.set_index(['assignee_id', 'cited_year'])
+
 def get_company_data(df, assignee_id):
     """Get data for a specific company"""
-    return df[df['assignee_id'] == assignee_id].copy()
+    return df[df['assignee_id'] == assignee_id]
 
-def create_citations_to_year_chart(df_companies, selected_year):
-    """Create chart showing citations made to patents from selected year for each subsequent year"""
-    fig = go.Figure()
-    
-    for assignee_id in df_companies['assignee_id'].unique():
-        company_data = df_companies[df_companies['assignee_id'] == assignee_id]
-        company_name = company_data['raw_assignee_organization'].iloc[0]
-        
-        # Get data for the selected year
-        year_data = company_data[company_data['cited_year'] == selected_year]
-        
-        if not year_data.empty:
-            # Get year columns (years after the selected year)
-            year_cols = [str(year) for year in range(selected_year + 1, 2026)]
-            
-            # Calculate citations received in each subsequent year
-            citations_by_year = []
-            for year_col in year_cols:
-                if year_col in year_data.columns:
-                    citations_in_year = year_data[year_col].sum()
-                    # Include all years, even those with 0 citations, for better visualization
-                    citations_by_year.append({
-                        'year': int(year_col),
-                        'citations': citations_in_year
-                    })
-            
-            if citations_by_year:
-                citations_df = pd.DataFrame(citations_by_year)
-                
-                fig.add_trace(go.Scatter(
-                    x=citations_df['year'],
-                    y=citations_df['citations'],
-                    mode='lines+markers',
-                    name=company_name,
-                    line=dict(width=3),
-                    hovertemplate=f"<b>{company_name}</b><br>" +
-                                 f"<b>Year:</b> %{{x}}<br>" +
-                                 f"<b>Citations:</b> %{{y}}<br>" +
-                                 "<extra></extra>"
-                ))
-    
-    fig.update_layout(
-        title=f"Citations to Patents from {selected_year} by Subsequent Year",
+LAYOUT_CACHE = {
+    "citations-to-year": go.Layout(
         xaxis_title="Year Citations Were Received",
         yaxis_title="Number of Citations",
         hovermode='x unified',
         plot_bgcolor='white',
         paper_bgcolor='white',
         font=dict(color='black')
-    )
-    
-    return fig
-
-def get_patents_in_year(df_companies, selected_year):
-    """Get number of patents assigned in the selected year for each company"""
-    patents_info = []
-    
-    for assignee_id in df_companies['assignee_id'].unique():
-        company_data = df_companies[df_companies['assignee_id'] == assignee_id]
-        company_name = company_data['raw_assignee_organization'].iloc[0]
-        
-        # Get data for the selected year
-        year_data = company_data[company_data['cited_year'] == selected_year]
-        
-        if not year_data.empty:
-            patents_assigned = year_data['patents_assigned'].sum()
-            patents_info.append({
-                'company': company_name,
-                'patents': patents_assigned
-            })
-        else:
-            patents_info.append({
-                'company': company_name,
-                'patents': 0
-            })
-    
-    return patents_info
-
-def create_patents_timeline(df_companies):
-    """Create timeline showing patents assigned per year for multiple companies"""
-    fig = go.Figure()
-    
-    for assignee_id in df_companies['assignee_id'].unique():
-        company_data = df_companies[df_companies['assignee_id'] == assignee_id]
-        company_name = company_data['raw_assignee_organization'].iloc[0]
-        
-        patents_by_year = company_data.groupby('cited_year')['patents_assigned'].sum().reset_index()
-        patents_by_year = patents_by_year.sort_values('cited_year')
-        
-        fig.add_trace(go.Scatter(
-            x=patents_by_year['cited_year'],
-            y=patents_by_year['patents_assigned'],
-            mode='lines+markers',
-            name=company_name,
-            line=dict(width=3),
-            hovertemplate=f"<b>{company_name}</b><br>" +
-                         f"<b>Year:</b> %{{x}}<br>" +
-                         f"<b>Patents:</b> %{{y}}<br>" +
-                         "<extra></extra>"
-        ))
-    
-    fig.update_layout(
+    ).to_plotly_json(),
+    "patents-timeline": go.Layout(
         title="Patents Assigned by Year - Company Comparison",
         xaxis_title="Year",
         yaxis_title="Number of Patents",
@@ -126,34 +127,8 @@ def create_patents_timeline(df_companies):
         plot_bgcolor='white',
         paper_bgcolor='white',
         font=dict(color='black')
-    )
-    
-    return fig
-
-def create_citations_timeline(df_companies):
-    """Create timeline showing total citations received per year for multiple companies"""
-    fig = go.Figure()
-    
-    for assignee_id in df_companies['assignee_id'].unique():
-        company_data = df_companies[df_companies['assignee_id'] == assignee_id]
-        company_name = company_data['raw_assignee_organization'].iloc[0]
-        
-        citations_by_year = company_data.groupby('cited_year')['total_citations'].sum().reset_index()
-        citations_by_year = citations_by_year.sort_values('cited_year')
-        
-        fig.add_trace(go.Scatter(
-            x=citations_by_year['cited_year'],
-            y=citations_by_year['total_citations'],
-            mode='lines+markers',
-            name=company_name,
-            line=dict(width=3),
-            hovertemplate=f"<b>{company_name}</b><br>" +
-                         f"<b>Year:</b> %{{x}}<br>" +
-                         f"<b>Citations:</b> %{{y}}<br>" +
-                         "<extra></extra>"
-        ))
-    
-    fig.update_layout(
+    ).to_plotly_json(),
+    "citations-timeline": go.Layout(
         title="Total Citations Received by Year - Company Comparison",
         xaxis_title="Year",
         yaxis_title="Total Citations",
@@ -161,23 +136,125 @@ def create_citations_timeline(df_companies):
         plot_bgcolor='white',
         paper_bgcolor='white',
         font=dict(color='black')
-    )
+    ).to_plotly_json(),
+}
+
+def create_trace(company_name, x, y, value_label):
+    """Create a company's line trace as a Plotly JSON dict"""
+    return go.Scattergl(
+        x=x,
+        y=y,
+        mode='lines+markers',
+        name=company_name,
+        line=dict(width=3),
+        hovertemplate=f"<b>{company_name}</b><br>" +
+                     f"<b>Year:</b> %{{x}}<br>" +
+                     f"<b>{value_label}:</b> %{{y}}<br>" +
+                     "<extra></extra>"
+    ).to_plotly_json()
+
+def get_trace_cache(company_names, patents_by_year, citations_by_year):
+    """Build both timeline traces for every company, keyed by assignee_id then tab"""
+    trace_cache = {}
+    for assignee_id, company_name in company_names.items():
+        patents = patents_by_year.loc[assignee_id]
+        citations = citations_by_year.loc[assignee_id]
+        trace_cache[assignee_id] = {
+            "patents-timeline": create_trace(company_name, patents.index.values, patents.values, "Patents"),
+            "citations-timeline": create_trace(company_name, citations.index.values, citations.values, "Citations"),
+        }
+    return trace_cache
+
+# Bounded to cover every (company, year) pair in the data: ~100 companies x ~50 years
+@functools.lru_cache(maxsize=8192)
+def get_citations_to_year_trace(assignee_id, selected_year):
+    """Get a company's citations-to-year trace, or None if it has no patents from that year"""
+    if (assignee_id, selected_year) not in CITATIONS_RECEIVED.index:
+        return None
     
-    return fig
+    # Citations received in each year after the selected year, including years with 0 citations;
+    # receiving_year is sorted within each key, so the later years start at a searchsorted offset
+    citations_df = CITATIONS_RECEIVED.loc[(assignee_id, selected_year)]
+    citations_df = citations_df.iloc[citations_df['receiving_year'].searchsorted(selected_year, side='right'):]
+    
+    if citations_df.empty:
+        return None
+    return create_trace(COMPANY_NAMES[assignee_id], citations_df['receiving_year'].values, citations_df['citations'].values, "Citations")
+
+def create_citations_to_year_chart(selected_companies, selected_year):
+    """Create chart showing citations made to patents from selected year for each subsequent year, as a figure dict"""
+    traces = [get_citations_to_year_trace(assignee_id, selected_year) for assignee_id in selected_companies]
+    layout = dict(LAYOUT_CACHE["citations-to-year"], title={'text': f"Citations to Patents from {selected_year} by Subsequent Year"})
+    return {'data': [trace for trace in traces if trace is not None], 'layout': layout}
+
+def get_patents_in_year(selected_companies, selected_year):
+    """Get number of patents assigned in the selected year for each company"""
+    # Ids that are not in the data (e.g. from a stale session) are left out of the summary
+    known_companies = [assignee_id for assignee_id in selected_companies if assignee_id in COMPANY_NAMES]
+    try:
+        patents = PATENTS_BY_YEAR.xs(selected_year, level='cited_year').reindex(known_companies, fill_value=0)
+    except KeyError:
+        # No company has patents from this year
+        patents = pd.Series(0, index=pd.Index(known_companies))
+    return pd.DataFrame({
+        'company': patents.index.map(COMPANY_NAMES),
+        'patents': patents.values
+    })
+
+def create_patents_timeline(selected_companies):
+    """Create timeline showing patents assigned per year for multiple companies, as a figure dict"""
+    return {
+        'data': [TRACE_CACHE[assignee_id]["patents-timeline"] for assignee_id in selected_companies if assignee_id in TRACE_CACHE],
+        'layout': LAYOUT_CACHE["patents-timeline"]
+    }
+
+def create_citations_timeline(selected_companies):
+    """Create timeline showing total citations received per year for multiple companies, as a figure dict"""
+    return {
+        'data': [TRACE_CACHE[assignee_id]["citations-timeline"] for assignee_id in selected_companies if assignee_id in TRACE_CACHE],
+        'layout': LAYOUT_CACHE["citations-timeline"]
+    }
 
 # Load data
 try:
     df = load_data()
-    companies = get_company_list(df)
-    available_years = sorted(df['cited_year'].unique())
+    COMPANY_NAMES = get_company_names(df)
+    companies = get_company_list(df, COMPANY_NAMES)
+    yearly_totals = get_yearly_totals(df)
+    CITATIONS_RECEIVED = get_citations_received(yearly_totals)
+    PATENTS_BY_YEAR = yearly_totals['patents_assigned']
+    CITATIONS_BY_YEAR = yearly_totals['total_citations']
+    TRACE_CACHE = get_trace_cache(COMPANY_NAMES, PATENTS_BY_YEAR, CITATIONS_BY_YEAR)
+    # cited_year is int16, so this unique pass is cheap; years with no data are left out
+    available_years = np.sort(df['cited_year'].unique()).tolist()
+    DATA_VERSION = get_data_version(df)
 except FileNotFoundError:
-    print("Could not find 'top_100_cited_companies_consolidated.csv' file")
+    print(f"Could not find '{PARQUET_PATH}' or '{CSV_PATH}' file")
     df = pd.DataFrame()
+    COMPANY_NAMES = {}
     companies = pd.DataFrame()
+    CITATIONS_RECEIVED = pd.DataFrame()
+    PATENTS_BY_YEAR = pd.Series(dtype=float)
+    CITATIONS_BY_YEAR = pd.Series(dtype=float)
+    TRACE_CACHE = {}
     available_years = []
+    DATA_VERSION = ''
+
+# Dropdown options are built once, before the layout
+company_options = [
+    {"label": label, "value": value}
+    for label, value in zip(companies['display_name'].tolist(), companies['assignee_id'].tolist())
+] if len(companies) > 0 else []
+year_options = [{"label": str(year), "value": year} for year in available_years]
 
 # Create Dash app
 app = Dash(__name__)
+cache = Cache(app.server, config={
+    'CACHE_TYPE': 'FileSystemCache',
+    'CACHE_DIR': os.path.join(os.path.dirname(os.path.abspath(__file__)), '.cache')
+})
+# Cached responses are only valid for the data and output version they were built from
+CACHE_VERSION = f"{RESPONSE_VERSION}-{DATA_VERSION}"
 
 app.layout = html.Div([
     html.H1("Patent Citation Dashboard", style={'textAlign': 'center', 'color': 'black'}),
@@ -186,7 +263,7 @@ app.layout = html.Div([
         html.Label("Select Companies:", style={'fontWeight': 'bold', 'color': 'black'}),
         dcc.Dropdown(
             id="company-dropdown",
-            options=[{"label": row['display_name'], "value": row['assignee_id']} for _, row in companies.iterrows()],
+            options=company_options,
             value=[companies['assignee_id'].iloc[0]] if len(companies) > 0 else [],
             multi=True,
             style={'backgroundColor': 'white', 'color': 'black'}
@@ -197,7 +274,7 @@ app.layout = html.Div([
         html.Label("Select Patent Year:", style={'fontWeight': 'bold', 'color': 'black'}),
         dcc.Dropdown(
             id="year-dropdown",
-            options=[{"label": str(year), "value": year} for year in available_years],
+            options=year_options,
             value=available_years[0] if len(available_years) > 0 else None,
             style={'backgroundColor': 'white', 'color': 'black'}
         ),
@@ -214,54 +291,49 @@ app.layout = html.Div([
     html.Div(id="tab-content", style={'margin': '20px'})
 ], style={'backgroundColor': 'white', 'minHeight': '100vh'})
 
-@app.callback(
-    [Output("summary-text", "children"),
-     Output("tab-content", "children")],
-    [Input("company-dropdown", "value"),
-     Input("year-dropdown", "value"),
-     Input("tabs", "value")]
-)
-def update_dashboard(selected_companies, selected_year, active_tab):
-    if not selected_companies or not selected_year:
-        return "Please select companies and a year to analyze.", ""
-    
-    # Get company data for all selected companies
-    companies_data = df[df['assignee_id'].isin(selected_companies)].copy()
-    
+@cache.memoize(timeout=3600, make_name=lambda fname: f"{fname}_{CACHE_VERSION}")
+def build_response(selected_companies, selected_year, active_tab):
+    """Build the summary and tab content for a selection; results are cached on disk"""
     # Get patents assigned in the selected year
-    patents_in_year = get_patents_in_year(companies_data, selected_year)
+    patents_in_year = get_patents_in_year(list(selected_companies), selected_year)
     
     # Create summary text showing patents assigned in selected year
-    summary_items = []
-    for patent_info in patents_in_year:
-        summary_items.append(
-            html.Li(
-                f"{patent_info['company']}: {patent_info['patents']:,.0f} patents assigned in {selected_year}",
-                style={'color': 'black', 'fontSize': '16px', 'margin': '5px 0'}
-            )
-        )
+    summary_lines = "\n".join(
+        f"{company}: {patents:,.0f} patents assigned in {selected_year}"
+        for company, patents in zip(patents_in_year['company'], patents_in_year['patents'])
+    )
     
     summary_text = html.Div([
         html.H3(f"Patents Assigned in {selected_year}", style={'color': 'black', 'marginBottom': '10px'}),
-        html.Ul(summary_items),
+        html.Pre(summary_lines, style={'color': 'black', 'fontSize': '16px', 'fontFamily': 'inherit', 'lineHeight': '1.6'}),
         html.P(f"Below shows how many times these {selected_year} patents were cited in each subsequent year.", 
                style={'color': 'black', 'fontStyle': 'italic', 'marginTop': '10px'})
     ])
     
-    # Create content based on active tab
+    # Create content based on active tab; figures are assembled from cached traces
     if active_tab == "citations-to-year":
-        fig = create_citations_to_year_chart(companies_data, selected_year)
-        content = dcc.Graph(figure=fig)
+        content = dcc.Graph(figure=create_citations_to_year_chart(selected_companies, selected_year))
     elif active_tab == "patents-timeline":
-        fig = create_patents_timeline(companies_data)
-        content = dcc.Graph(figure=fig)
+        content = dcc.Graph(figure=create_patents_timeline(selected_companies))
     elif active_tab == "citations-timeline":
-        fig = create_citations_timeline(companies_data)
-        content = dcc.Graph(figure=fig)
+        content = dcc.Graph(figure=create_citations_timeline(selected_companies))
     else:
         content = ""
     
     return summary_text, content
 
+@app.callback(
+    [Output("summary-text", "children"),
+     Output("tab-content", "children")],
+    [Input("company-dropdown", "value"),
+     Input("year-dropdown", "value"),
+     Input("tabs", "value")]
+)
+def update_dashboard(selected_companies, selected_year, active_tab):
+    if not selected_companies or not selected_year:
+        return "Please select companies and a year to analyze.", ""
+    
+    return build_response(tuple(selected_companies), int(selected_year), active_tab)
+
 if __name__ == "__main__":
     app.run_server(debug=True)